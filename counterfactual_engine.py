@@ -0,0 +1,368 @@
+import argparse
+import contextlib
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from file_parser import FileParser
+from gale_shapley import initial_project_rounds_state, project_proposing_rounds
+
+STATE_KEYS = ('next_choice', 'held_count', 'assignment', 'held_srank', 'held_prank')
+
+class CounterfactualEngine:
+    """
+    Avalia em lote alterações de um único agente sobre o emparelhamento
+    Project-Optimal (modo em rodadas, só arestas mutuamente aceitáveis):
+    - ('student', codigo, nova_ordem): aluno reordena sua lista de preferências
+    - ('project', codigo, {'max_students': n}) ou ({'min_grade': m})
+
+    Cada alteração parte do baseline já resolvido em vez de resolver tudo de
+    novo. A resolução em rodadas não depende da ordem das propostas, então:
+    - aumentar vagas ou baixar min_grade só acrescenta propostas: retoma do
+      estado final do baseline;
+    - nos demais casos, as rodadas são idênticas ao baseline até a primeira
+      em que a alteração faz diferença: retoma do checkpoint anterior a ela
+      (ou reaproveita o baseline inteiro, se essa rodada não existe).
+    """
+
+    def __init__(self, projects, students, workers=None, checkpoint_every=1):
+        """
+        :param projects, students: instância como sai do FileParser (sem redução;
+            a elegibilidade por nota é tratada aqui para permitir mudar min_grade)
+        :param checkpoint_every: intervalo (em rodadas) entre cópias completas do estado
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.checkpoint_every = checkpoint_every
+
+        self.student_codes = [s.code for s in students]
+        self.project_codes = [p.code for p in projects]
+        self.student_id = {code: i for i, code in enumerate(self.student_codes)}
+        self.project_id = {code: i for i, code in enumerate(self.project_codes)}
+        n_projects = len(projects)
+
+        # Lista "verdadeira" de cada aluno: projetos existentes, sem repetição
+        self.student_lists = [[self.project_id[p] for p in dict.fromkeys(s.preferences) if p in self.project_id]
+                              for s in students]
+        self.grades = np.array([s.grade for s in students], dtype=np.int64)
+        self.min_grade = np.array([p.min_grade for p in projects], dtype=np.int64)
+
+        # Cada projeto ordena por nota (decrescente) e código todos os alunos que o
+        # listam; os elegíveis (nota >= min_grade) formam um prefixo dessa lista.
+        listers = [[] for _ in projects]
+        for s, prefs in enumerate(self.student_lists):
+            for p in prefs:
+                listers[p].append(s)
+        project_flat, project_srank, project_start = [], [], [0]
+        self.student_slots = [[] for _ in students]  # posição de s em project_flat, para cada projeto listado
+        self.sorted_grades = []
+        for p, ids in enumerate(listers):
+            ids.sort(key=lambda s: (-students[s].grade, students[s].code))
+            for s in ids:
+                self.student_slots[s].append(len(project_flat))
+                project_flat.append(s)
+                project_srank.append(self.student_lists[s].index(p))
+            project_start.append(len(project_flat))
+            self.sorted_grades.append(self.grades[ids])
+        # student_slots[s] segue a ordem dos projetos; reordena para seguir student_lists[s]
+        for s, prefs in enumerate(self.student_lists):
+            by_project = dict(zip(sorted(prefs), self.student_slots[s]))
+            self.student_slots[s] = np.array([by_project[p] for p in prefs], dtype=np.int64)
+
+        self.arrays = {
+            'project_start': np.array(project_start, dtype=np.int64),
+            'project_flat': np.array(project_flat, dtype=np.int64),
+            'project_srank': np.array(project_srank, dtype=np.int64),
+            'project_len': np.array([self._eligible_count(p, self.min_grade[p]) for p in range(n_projects)],
+                                    dtype=np.int64),
+            'capacity': np.array([p.max_students for p in projects], dtype=np.int64),
+        }
+        self.max_rounds = int(self.arrays['project_len'].sum()) + len(listers) + 1
+
+        self._solve_baseline()
+
+    def _eligible_count(self, p, min_grade):
+        # sorted_grades[p] é decrescente: conta quantos têm nota >= min_grade
+        return int(np.searchsorted(-self.sorted_grades[p], -min_grade, side='right'))
+
+    # =========================================================================
+    # BASELINE
+    # =========================================================================
+    def _solve_baseline(self):
+        n_students, n_projects = len(self.student_codes), len(self.project_codes)
+        state = initial_project_rounds_state(n_students, n_projects)
+
+        checkpoints = {}
+        round_next, round_held, offers_log = [], [], []
+        def record(round_number, proposer, proposed):
+            round_next.append(state['next_choice'].copy())
+            round_held.append(state['held_count'].copy())
+            offers_log.append((np.full(proposer.size, round_number, dtype=np.int64), proposer, proposed))
+            if round_number % self.checkpoint_every == 0:
+                checkpoints[round_number] = {key: state[key].copy() for key in STATE_KEYS}
+
+        self.baseline_rounds, self.baseline_proposals = project_proposing_rounds(
+            self.arrays, state, self.max_rounds, before_round=record)
+        self.final_state = state
+        self.checkpoints = checkpoints
+        self.baseline = state['assignment'].copy()
+
+        # Por rodada: posição na lista e alunos retidos de cada projeto no início da rodada
+        self.round_next = np.array(round_next, dtype=np.int64).reshape(-1, n_projects)
+        self.round_held = np.array(round_held, dtype=np.int64).reshape(-1, n_projects)
+        rounds = np.concatenate([r for r, _, _ in offers_log]) if offers_log else np.zeros(0, dtype=np.int64)
+        proposers = np.concatenate([p for _, p, _ in offers_log]) if offers_log else np.zeros(0, dtype=np.int64)
+        proposed = np.concatenate([s for _, _, s in offers_log]) if offers_log else np.zeros(0, dtype=np.int64)
+        self.round_offers = np.zeros_like(self.round_held)
+        np.add.at(self.round_offers, (rounds, proposers), 1)
+
+        # Ofertas recebidas por aluno, em ordem de rodada
+        order = np.lexsort((proposers, rounds, proposed))
+        self.offer_round, self.offer_project = rounds[order], proposers[order]
+        self.offer_start = np.searchsorted(proposed[order], np.arange(n_students + 1))
+
+    # =========================================================================
+    # DIVERGÊNCIA E RETOMADA
+    # =========================================================================
+    def _student_divergence(self, s, new_rank):
+        """Primeira rodada em que o aluno s escolheria diferente com new_rank {projeto: rank} (None = nunca)."""
+        old_rank = {p: i for i, p in enumerate(self.student_lists[s])}
+        held = -1
+        start, stop = self.offer_start[s], self.offer_start[s + 1]
+        i = start
+        while i < stop:
+            round_number = self.offer_round[i]
+            j = i
+            while j < stop and self.offer_round[j] == round_number:
+                j += 1
+            candidates = self.offer_project[i:j].tolist() + ([held] if held >= 0 else [])
+            old_best = min(candidates, key=lambda p: old_rank[p])
+            new_best = min(candidates, key=lambda p: new_rank[p])
+            if old_best != new_best:
+                return int(round_number)
+            held = old_best
+            i = j
+        return None
+
+    def _project_divergence(self, p, capacity=None, project_len=None):
+        """Primeira rodada em que o projeto p ofereceria diferente (None = nunca)."""
+        offers = self.round_offers[:, p]
+        if capacity is not None:
+            diverged = np.flatnonzero(self.round_held[:, p] + offers > capacity)
+        else:
+            diverged = np.flatnonzero(self.round_next[:, p] + offers > project_len)
+        return int(diverged[0]) if diverged.size else None
+
+    def _resume(self, from_round):
+        """Copia o estado a partir do qual a alteração é reavaliada ('final' = fim do baseline)."""
+        if from_round == 'final':
+            return {key: self.final_state[key].copy() for key in STATE_KEYS}, self.baseline_rounds
+        checkpoint = max(r for r in self.checkpoints if r <= from_round)
+        return {key: self.checkpoints[checkpoint][key].copy() for key in STATE_KEYS}, checkpoint
+
+    def evaluate(self, change):
+        """
+        Avalia uma alteração e retorna {'assignment': vetor de projetos por aluno,
+        'rounds': rodadas re-executadas}. Os arrays do baseline são alterados no
+        lugar durante a avaliação e restaurados no final.
+        """
+        kind, code, value = change
+        arrays = self.arrays
+
+        if kind == 'student':
+            s = self.student_id[code]
+            listed = set(self.student_lists[s])
+            order = [self.project_id[p] for p in dict.fromkeys(value) if self.project_id.get(p) in listed]
+            if set(order) != listed:
+                raise ValueError(f"A nova ordem de {code} deve conter exatamente os projetos da lista original")
+            new_rank = {p: i for i, p in enumerate(order)}
+            from_round = self._student_divergence(s, new_rank)
+            target, index = arrays['project_srank'], self.student_slots[s]
+            new_value = np.array([new_rank[p] for p in self.student_lists[s]], dtype=np.int64)
+
+        elif kind == 'project':
+            p = self.project_id[code]
+            if set(value) - {'max_students', 'min_grade'} or len(value) != 1:
+                raise ValueError("Alterações de projeto suportadas: max_students ou min_grade (uma por vez)")
+            if 'max_students' in value:
+                target, index, new_value = arrays['capacity'], p, int(value['max_students'])
+                if new_value >= target[p]:
+                    from_round = 'final'
+                else:
+                    from_round = self._project_divergence(p, capacity=new_value)
+            else:
+                target, index = arrays['project_len'], p
+                new_value = self._eligible_count(p, int(value['min_grade']))
+                if new_value >= target[p]:
+                    from_round = 'final'
+                else:
+                    from_round = self._project_divergence(p, project_len=new_value)
+        else:
+            raise ValueError("Tipo de alteração desconhecido. Use 'student' ou 'project'.")
+
+        if from_round is None:
+            return {'assignment': self.baseline, 'rounds': 0}
+
+        state, start_round = self._resume(from_round)
+        if kind == 'student' and state['assignment'][s] >= 0:
+            # O rank do projeto retido foi gravado com a ordem antiga
+            state['held_srank'][s] = new_rank[int(state['assignment'][s])]
+        old_value = target[index].copy()
+        target[index] = new_value
+        try:
+            rounds, _ = project_proposing_rounds(arrays, state, self.max_rounds)
+        finally:
+            target[index] = old_value
+        return {'assignment': state['assignment'], 'rounds': rounds}
+
+    def evaluate_batch(self, changes):
+        """Avalia várias alterações, divididas entre processos do pool."""
+        if self.workers <= 1 or len(changes) <= 1:
+            return [self.evaluate(change) for change in changes]
+
+        chunk_size = -(-len(changes) // self.workers)
+        chunks = [changes[i:i + chunk_size] for i in range(0, len(changes), chunk_size)]
+        with ProcessPoolExecutor(max_workers=len(chunks), initializer=_init_worker, initargs=(self,)) as pool:
+            return [result for chunk in pool.map(_evaluate_chunk, chunks) for result in chunk]
+
+    # =========================================================================
+    # AUDITORIAS
+    # =========================================================================
+    def _rank_of(self, s, p):
+        return self.student_lists[s].index(p) + 1 if p >= 0 else None
+
+    def _moved(self, assignment):
+        return np.flatnonzero(assignment != self.baseline)
+
+    def audit_students(self):
+        """
+        Para cada aluno, testa as reordenações que colocam em primeiro lugar um
+        projeto que ele prefere (pela lista verdadeira) ao obtido no baseline.
+        Retorna uma linha por aluno com o melhor projeto alcançável por manipulação.
+        """
+        changes, owners = [], []
+        for s, prefs in enumerate(self.student_lists):
+            baseline = self.baseline[s]
+            better = prefs[:prefs.index(baseline)] if baseline >= 0 else prefs
+            for p in better:
+                order = [p] + [q for q in prefs if q != p]
+                changes.append(('student', self.student_codes[s], [self.project_codes[q] for q in order]))
+                owners.append((s, p))
+
+        rows = {s: {'student': code,
+                    'baseline': self.project_codes[self.baseline[s]] if self.baseline[s] >= 0 else None,
+                    'baseline_rank': self._rank_of(s, self.baseline[s]),
+                    'best': None, 'best_rank': None, 'reported_order': None, 'tested': 0}
+                for s, code in enumerate(self.student_codes)}
+
+        for (s, p), change, result in zip(owners, changes, self.evaluate_batch(changes)):
+            row = rows[s]
+            row['tested'] += 1
+            obtained = result['assignment'][s]
+            if obtained < 0:
+                continue
+            rank = self._rank_of(s, obtained)
+            improves = row['baseline_rank'] is None or rank < row['baseline_rank']
+            if improves and (row['best_rank'] is None or rank < row['best_rank']):
+                row['best'], row['best_rank'], row['reported_order'] = self.project_codes[obtained], rank, change[2]
+
+        for row in rows.values():
+            row['manipulable'] = row['best'] is not None
+        return [rows[s] for s in range(len(self.student_codes))]
+
+    def audit_projects(self, capacity_deltas=(-1, 1), grade_deltas=(-1, 1)):
+        """
+        Para cada projeto, aplica cada variação de max_students e de min_grade e
+        conta quantos alunos mudam de projeto em relação ao baseline.
+        """
+        changes = []
+        for p, code in enumerate(self.project_codes):
+            capacity = int(self.arrays['capacity'][p])
+            for delta in capacity_deltas:
+                if capacity + delta >= 0:
+                    changes.append(('project', code, {'max_students': capacity + delta}))
+            for delta in grade_deltas:
+                changes.append(('project', code, {'min_grade': int(self.min_grade[p]) + delta}))
+
+        rows = []
+        baseline_matched = int((self.baseline >= 0).sum())
+        for change, result in zip(changes, self.evaluate_batch(changes)):
+            (field, new_value), = change[2].items()
+            p = self.project_id[change[1]]
+            moved = self._moved(result['assignment'])
+            rows.append({
+                'project': change[1],
+                'field': field,
+                'old': int(self.arrays['capacity'][p]) if field == 'max_students' else int(self.min_grade[p]),
+                'new': new_value,
+                'moved': len(moved),
+                'moved_students': [self.student_codes[s] for s in moved],
+                'matched_delta': int((result['assignment'] >= 0).sum()) - baseline_matched,
+                'rounds': result['rounds'],
+            })
+        rows.sort(key=lambda row: -row['moved'])
+        return rows
+
+    def sensitivity_table(self, student_rows, project_rows):
+        """
+        Junta as auditorias numa tabela por agente:
+        - alunos: manipulação possível e quantas alterações de projeto os movem
+        - projetos: alteração que move mais alunos
+        """
+        exposure = {code: 0 for code in self.student_codes}
+        for row in project_rows:
+            for code in row['moved_students']:
+                exposure[code] += 1
+
+        students = [dict(row, exposure=exposure[row['student']]) for row in student_rows]
+        projects = {}
+        for row in project_rows:
+            best = projects.get(row['project'])
+            if best is None or row['moved'] > best['moved']:
+                projects[row['project']] = row
+        return {'students': students, 'projects': [projects[code] for code in self.project_codes if code in projects]}
+
+    def print_sensitivity_table(self, table):
+        print("\n       SENSIBILIDADE POR ALUNO")
+        print("Aluno\tProjeto\tRank\tManipulável\tMelhor\tRank\tExposição")
+        for row in table['students']:
+            print(f"{row['student']}\t{row['baseline'] or '-'}\t{row['baseline_rank'] or '-'}\t"
+                  f"{'SIM' if row['manipulable'] else 'não'}\t\t{row['best'] or '-'}\t{row['best_rank'] or '-'}\t"
+                  f"{row['exposure']}")
+
+        print("\n       SENSIBILIDADE POR PROJETO")
+        print("Projeto\tAlteração\t\tAlunos movidos\tAlocados (Δ)")
+        for row in sorted(table['projects'], key=lambda row: -row['moved']):
+            print(f"{row['project']}\t{row['field']} {row['old']}->{row['new']}\t{row['moved']}\t\t{row['matched_delta']:+d}")
+
+# Estado por processo do pool: o engine é enviado uma única vez a cada worker
+_worker_engine = None
+
+def _init_worker(engine):
+    global _worker_engine
+    _worker_engine = engine
+
+def _evaluate_chunk(changes):
+    return [_worker_engine.evaluate(change) for change in changes]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Auditoria contrafactual do emparelhamento Project-Optimal")
+    parser.add_argument("filename", nargs="?", default=os.path.join(os.path.dirname(__file__), "entradaProj2.25TAG.txt"))
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        projects, students = FileParser().parse_file(args.filename)
+
+    start = time.perf_counter()
+    engine = CounterfactualEngine(projects, students, workers=args.workers)
+    student_rows = engine.audit_students()
+    project_rows = engine.audit_projects()
+    elapsed = time.perf_counter() - start
+
+    engine.print_sensitivity_table(engine.sensitivity_table(student_rows, project_rows))
+    evaluated = sum(row['tested'] for row in student_rows) + len(project_rows)
+    print(f"\n{evaluated} alterações avaliadas em {elapsed:.2f}s "
+          f"(baseline: {engine.baseline_rounds} rodadas, {engine.baseline_proposals} propostas)")
@@ -1,6 +1,157 @@
 from collections import deque
 import random
 
+import numpy as np
+
+def _segment_positions(starts, counts):
+    """Posições starts[i], starts[i]+1, ..., starts[i]+counts[i]-1 de cada segmento, concatenadas."""
+    offset = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offset
+
+def initial_student_rounds_state(arrays):
+    """Estado inicial do Student-Optimal em rodadas (todos livres, nenhuma proposta)."""
+    n_students = arrays['student_start'].size - 1
+    return {
+        'next_choice': np.zeros(n_students, dtype=np.int64),   # próxima posição na lista de cada aluno
+        'assignment': np.full(n_students, -1, dtype=np.int64), # projeto retido por aluno (-1 = livre)
+        'held_prank': np.zeros(n_students, dtype=np.int64),    # rank do aluno na lista do projeto retido
+        'held_count': np.zeros(arrays['capacity'].size, dtype=np.int64),
+        # Alunos retidos por projeto: slots[slot_start[p]:slot_start[p] + held_count[p]]
+        'slots': np.full(int(arrays['slot_start'][-1]), -1, dtype=np.int64),
+        'free': np.arange(n_students, dtype=np.int64),
+    }
+
+def student_proposing_rounds(arrays, state, max_rounds, after_round=None):
+    """
+    Núcleo vetorizado do Student-Optimal em rodadas. Altera 'state' no lugar e
+    retorna (rodadas, propostas).
+    :param arrays: dict com as listas dos alunos em CSR (student_start, student_flat,
+        student_prank) e capacity/slot_start dos projetos
+    :param after_round: callback(rodada, alunos, projetos, alunos_rejeitados, projetos_rejeitados)
+    """
+    start, flat, prank = arrays['student_start'], arrays['student_flat'], arrays['student_prank']
+    capacity, slot_start = arrays['capacity'], arrays['slot_start']
+    next_choice, assignment, held_prank = state['next_choice'], state['assignment'], state['held_prank']
+    held_count, slots = state['held_count'], state['slots']
+    length = np.diff(start)
+
+    rounds = 0
+    total_proposals = 0
+    while rounds < max_rounds:
+        # Só quem foi rejeitado na rodada anterior (e ainda tem opções) está livre
+        free = state['free']
+        free = free[next_choice[free] < length[free]]
+        if free.size == 0:
+            break
+
+        position = start[free] + next_choice[free]
+        proposed, proposed_rank = flat[position], prank[position]
+        next_choice[free] += 1
+        total_proposals += free.size
+
+        # Candidatos: novos proponentes + alunos já retidos nos projetos atingidos
+        touched = np.unique(proposed)
+        held_slots = _segment_positions(slot_start[touched], held_count[touched])
+        held = slots[held_slots]
+        candidates = np.concatenate([held, free])
+        cand_project = np.concatenate([assignment[held], proposed])
+        cand_rank = np.concatenate([held_prank[held], proposed_rank])
+
+        # Ordena por (projeto, rank) e mantém os primeiros 'capacity' de cada projeto
+        order = np.lexsort((cand_rank, cand_project))
+        candidates, cand_project, cand_rank = candidates[order], cand_project[order], cand_rank[order]
+        group_start = np.searchsorted(cand_project, cand_project, side="left")
+        rank_in_project = np.arange(candidates.size) - group_start
+        keep = rank_in_project < capacity[cand_project]
+
+        kept = candidates[keep]
+        assignment[candidates[~keep]] = -1
+        assignment[kept] = cand_project[keep]
+        held_prank[kept] = cand_rank[keep]
+        slots[slot_start[cand_project[keep]] + rank_in_project[keep]] = kept
+        held_count[touched] = np.minimum(np.bincount(cand_project, minlength=touched.max() + 1)[touched],
+                                         capacity[touched])
+        state['free'] = candidates[~keep]
+
+        if after_round is not None:
+            after_round(rounds, free, proposed, candidates[~keep], cand_project[~keep])
+
+        rounds += 1
+
+    return rounds, total_proposals
+
+def initial_project_rounds_state(n_students, n_projects):
+    """Estado inicial do Project-Optimal em rodadas (ninguém propôs nem foi aceito)."""
+    return {
+        'next_choice': np.zeros(n_projects, dtype=np.int64),   # próxima posição na lista de cada projeto
+        'held_count': np.zeros(n_projects, dtype=np.int64),    # alunos retidos por projeto
+        'assignment': np.full(n_students, -1, dtype=np.int64), # projeto retido por aluno (-1 = livre)
+        'held_srank': np.zeros(n_students, dtype=np.int64),    # rank do projeto retido na lista do aluno
+        'held_prank': np.zeros(n_students, dtype=np.int64),    # rank do aluno na lista do projeto retido
+    }
+
+def project_proposing_rounds(arrays, state, max_rounds, before_round=None, after_round=None):
+    """
+    Núcleo vetorizado do Project-Optimal em rodadas, separado da classe para
+    poder ser retomado a partir de qualquer estado (ver CounterfactualEngine).
+    Altera 'state' no lugar e retorna (rodadas, propostas).
+    :param arrays: dict com as listas dos projetos em CSR (project_start,
+        project_flat, project_srank), project_len e capacity
+    :param before_round: callback(rodada, proponentes, alunos) antes de aplicar a rodada
+    :param after_round: callback(rodada, proponentes, alunos, alunos_rejeitados, projetos_rejeitados)
+    """
+    start, flat, srank = arrays['project_start'], arrays['project_flat'], arrays['project_srank']
+    pref_len, capacity = arrays['project_len'], arrays['capacity']
+    next_choice, held_count, assignment = state['next_choice'], state['held_count'], state['assignment']
+    held_srank, held_prank = state['held_srank'], state['held_prank']
+
+    rounds = 0
+    total_proposals = 0
+    while rounds < max_rounds:
+        offers = np.minimum(capacity - held_count, pref_len - next_choice)
+        active = np.flatnonzero(offers > 0)
+        if active.size == 0:
+            break
+
+        # Cada projeto ativo convida os próximos 'offers[p]' alunos da sua lista
+        counts = offers[active]
+        proposer = np.repeat(active, counts)
+        position = _segment_positions(start[active] + next_choice[active], counts)
+        proposed = flat[position]
+        if before_round is not None:
+            before_round(rounds, proposer, proposed)
+        next_choice[active] += counts
+        total_proposals += proposed.size
+
+        # Cada aluno atingido escolhe entre a oferta atual e as novas
+        touched = np.unique(proposed)
+        held = touched[assignment[touched] >= 0]
+        cand_student = np.concatenate([held, proposed])
+        cand_project = np.concatenate([assignment[held], proposer])
+        cand_new = np.concatenate([np.zeros(held.size, dtype=np.int64), np.ones(proposed.size, dtype=np.int64)])
+        cand_rank = np.concatenate([held_srank[held], srank[position]])
+        cand_prank = np.concatenate([held_prank[held], position - start[proposer]])
+
+        order = np.lexsort((cand_project, cand_new, cand_rank, cand_student))
+        cand_student, cand_project = cand_student[order], cand_project[order]
+        first = np.ones(cand_student.size, dtype=bool)
+        first[1:] = cand_student[1:] != cand_student[:-1]
+
+        winners, won = cand_student[first], cand_project[first]
+        previous = assignment[winners]
+        np.subtract.at(held_count, previous[previous >= 0], 1)
+        np.add.at(held_count, won, 1)
+        assignment[winners] = won
+        held_srank[winners] = cand_rank[order][first]
+        held_prank[winners] = cand_prank[order][first]
+
+        if after_round is not None:
+            after_round(rounds, proposer, proposed, cand_student[~first], cand_project[~first])
+
+        rounds += 1
+
+    return rounds, total_proposals
+
 class GaleShapley:
     def __init__(self, students, projects):
         self.students = {s.code: s for s in students}
@@ -19,6 +170,7 @@ class GaleShapley:
         self.rejections = set()
         self.proposals_history = []
         self.free_students = None   # Usado no Student-Optimal
+        self.run_counters = {}      # {'iterations': n, 'proposals': n} da última execução
         
         # Garante que todo projeto comece com lista vazia no matching
         for project_code in self.projects:
@@ -31,15 +183,25 @@ class GaleShapley:
             student.proposal_index = 0
             student.matched_project = None
 
-    def match(self, proposer_type="student", random_order=False, max_iterations=500, collect_history=False):
+    def match(self, proposer_type="student", random_order=False, max_iterations=500, collect_history=False, batched=False):
         """
         Método principal que direciona para a variação correta do algoritmo.
         :param proposer_type: 'student' (Orientado a Aluno) ou 'project' (Orientado a Projeto)
         :param random_order: Se True, escolhe o proponente aleatoriamente da fila.
+        :param batched: Se True, usa o modo em rodadas paralelas (todos os proponentes
+            livres propõem ao mesmo tempo). Nesse modo max_iterations limita o número
+            de rodadas e random_order é ignorado (o resultado não depende da ordem).
         """
         # Limpa o estado antes de começar uma nova execução
         self.reset_state()
-        
+
+        if batched:
+            if proposer_type == "student":
+                return self._match_student_optimal_rounds(max_iterations, collect_history)
+            elif proposer_type == "project":
+                return self._match_project_optimal_rounds(max_iterations, collect_history)
+            raise ValueError("Tipo de proponente desconhecido. Use 'student' ou 'project'.")
+
         if proposer_type == "student":
             result = self._match_student_optimal(random_order, max_iterations, collect_history)
         elif proposer_type == "project":
@@ -134,6 +296,10 @@ class GaleShapley:
             iteration += 1
 
         print(f"Algoritmo (Student-Optimal | Random={random_order}) convergiu em {iteration} iterações")
+        self.run_counters = {
+            'iterations': iteration,
+            'proposals': sum(1 for p in self.proposals_history if p['type'] == 'active')
+        }
         self._finalize_matching()
 
         if collect_history:
@@ -240,6 +406,10 @@ class GaleShapley:
             iteration += 1
 
         print(f"Algoritmo (Project-Optimal | Random={random_order}) convergiu em {iteration} iterações")
+        self.run_counters = {
+            'iterations': iteration,
+            'proposals': sum(1 for p in self.proposals_history if p['type'] == 'active')
+        }
         self._finalize_matching()
 
         if collect_history:
@@ -255,6 +425,196 @@ class GaleShapley:
 
         return self.matching
 
+    # =========================================================================
+    # VARIAÇÃO 3: RODADAS PARALELAS (Vetorizado com NumPy)
+    # =========================================================================
+    def _build_index_arrays(self):
+        """
+        Converte alunos/projetos para ids inteiros e monta as listas usadas pelo
+        modo em rodadas em formato CSR (uma lista após a outra num vetor só),
+        sem matrizes densas alunos x projetos:
+        - student_flat[student_start[s]:student_start[s+1]]: projetos aceitáveis de s, em ordem
+        - student_prank: rank de s na lista de cada um desses projetos
+        - project_flat[project_start[p]:project_start[p+1]]: preference_list de p
+        - project_srank: rank de p na lista de cada um desses alunos
+        """
+        student_codes = list(self.students.keys())
+        project_codes = list(self.projects.keys())
+        student_id = {code: i for i, code in enumerate(student_codes)}
+        project_id = {code: i for i, code in enumerate(project_codes)}
+        n_students, n_projects = len(student_codes), len(project_codes)
+
+        # Listas dos alunos: 'accepted' remove projetos inexistentes e com nota
+        # insuficiente (os casos que o modo sequencial pula um a um); 'listed'
+        # só remove inexistentes e repetidos, e define o rank do projeto para o aluno.
+        accepted, accepted_len, listed, listed_len = [], [], [], []
+        for code in student_codes:
+            student = self.students[code]
+            prefs = [project_id[p] for p in student.preferences if p in project_id]
+            ok = [p for p in prefs if student.grade >= self.projects[project_codes[p]].min_grade]
+            unique = list(dict.fromkeys(prefs))
+            accepted.extend(ok)
+            accepted_len.append(len(ok))
+            listed.extend(unique)
+            listed_len.append(len(unique))
+
+        project_flat, project_len = [], []
+        for code in project_codes:
+            ids = [student_id[s] for s in self.projects[code].preference_list if s in student_id]
+            project_flat.extend(ids)
+            project_len.append(len(ids))
+
+        as_array = lambda values: np.array(values, dtype=np.int64)
+        student_flat, student_len = as_array(accepted), as_array(accepted_len)
+        project_flat, project_len = as_array(project_flat), as_array(project_len)
+        student_start = np.concatenate([[0], np.cumsum(student_len)]).astype(np.int64)
+        project_start = np.concatenate([[0], np.cumsum(project_len)]).astype(np.int64)
+
+        # Projetos fora da lista do aluno (e alunos fora da lista do projeto)
+        # empatam entre si, atrás de todos os listados
+        unlisted = n_students + n_projects
+        student_of_entry = np.repeat(np.arange(n_students), student_len)
+        project_of_entry = np.repeat(np.arange(n_projects), project_len)
+
+        # Rank de cada aluno na lista de cada projeto, buscado pelo par (projeto, aluno)
+        project_keys = project_of_entry * n_students + project_flat
+        project_positions = np.arange(project_flat.size) - np.repeat(project_start[:-1], project_len)
+        student_prank = self._lookup_rank(project_keys, project_positions,
+                                          student_flat * n_students + student_of_entry, unlisted)
+
+        # Rank de cada projeto na lista de cada aluno, buscado pelo par (aluno, projeto)
+        listed, listed_len = as_array(listed), as_array(listed_len)
+        listed_start = np.cumsum(listed_len) - listed_len
+        listed_keys = np.repeat(np.arange(n_students), listed_len) * n_projects + listed
+        listed_positions = np.arange(listed.size) - np.repeat(listed_start, listed_len)
+        project_srank = self._lookup_rank(listed_keys, listed_positions,
+                                          project_flat * n_projects + project_of_entry, unlisted)
+
+        capacity = as_array([self.projects[code].max_students for code in project_codes])
+        # Vagas reservadas por projeto no Student-Optimal: nunca mais que o número de propostas possíveis
+        slots = np.minimum(capacity, np.bincount(student_flat, minlength=n_projects))
+
+        return {
+            "student_codes": student_codes,
+            "project_codes": project_codes,
+            "student_start": student_start,
+            "student_flat": student_flat,
+            "student_prank": student_prank,
+            "project_start": project_start,
+            "project_flat": project_flat,
+            "project_srank": project_srank,
+            "project_len": project_len,
+            "capacity": capacity,
+            "slot_start": np.concatenate([[0], np.cumsum(slots)]).astype(np.int64),
+        }
+
+    @staticmethod
+    def _lookup_rank(keys, positions, queries, missing):
+        """Para cada chave em 'queries', a posição da primeira ocorrência em 'keys' (ou 'missing')."""
+        order = np.argsort(keys, kind="stable")
+        keys, positions = keys[order], positions[order]
+        found = np.searchsorted(keys, queries)
+        found_clipped = np.minimum(found, max(keys.size - 1, 0))
+        hit = (found < keys.size) & (keys[found_clipped] == queries) if keys.size else np.zeros(queries.size, dtype=bool)
+        return np.where(hit, positions[found_clipped] if keys.size else missing, missing).astype(np.int64)
+
+    def _match_student_optimal_rounds(self, max_rounds, collect_history=False):
+        """
+        Student-Optimal em rodadas: todo aluno livre propõe ao próximo projeto da
+        sua lista ao mesmo tempo, e cada projeto que recebeu propostas mantém os
+        max_students melhores entre os que já segurava e os novos, num único passo
+        vetorizado. O resultado é o mesmo emparelhamento ótimo para os alunos.
+        """
+        idx = self._build_index_arrays()
+        student_codes, project_codes = idx["student_codes"], idx["project_codes"]
+        state = initial_student_rounds_state(idx)
+
+        matching_data = []
+        def record(round_number, proposer, proposed, rejected_students, rejected_projects):
+            for s, p in zip(rejected_students.tolist(), rejected_projects.tolist()):
+                self.rejections.add((student_codes[s], project_codes[p]))
+            self._record_round(matching_data, round_number, proposer, proposed, state['assignment'], student_codes, project_codes)
+
+        rounds, total_proposals = student_proposing_rounds(idx, state, max_rounds,
+                                                           after_round=record if collect_history else None)
+
+        print(f"Algoritmo (Student-Optimal | Rodadas paralelas) convergiu em {rounds} rodadas ({total_proposals} propostas)")
+        self.run_counters = {'iterations': rounds, 'proposals': total_proposals}
+        for s, code in enumerate(student_codes):
+            self.students[code].proposal_index = int(state['next_choice'][s])
+        return self._finish_rounds(state, idx, collect_history, matching_data, rounds)
+
+    def _match_project_optimal_rounds(self, max_rounds, collect_history=False):
+        """
+        Project-Optimal em rodadas: cada projeto com vagas livres convida de uma
+        vez os próximos alunos da sua lista (um por vaga livre), e cada aluno
+        fica com a melhor oferta entre a que segurava e as novas. Projetos fora
+        da lista do aluno empatam; no empate o aluno mantém a oferta atual (como
+        no modo sequencial) e, entre ofertas novas, fica com a de menor id.
+        """
+        idx = self._build_index_arrays()
+        student_codes, project_codes = idx["student_codes"], idx["project_codes"]
+        state = initial_project_rounds_state(len(student_codes), len(project_codes))
+
+        matching_data = []
+        def record(round_number, proposer, proposed, rejected_students, rejected_projects):
+            for s, p in zip(rejected_students.tolist(), rejected_projects.tolist()):
+                self.rejections.add((student_codes[s], project_codes[p]))
+            self._record_round(matching_data, round_number, proposed, proposer, state['assignment'], student_codes, project_codes)
+
+        rounds, total_proposals = project_proposing_rounds(idx, state, max_rounds,
+                                                           after_round=record if collect_history else None)
+
+        print(f"Algoritmo (Project-Optimal | Rodadas paralelas) convergiu em {rounds} rodadas ({total_proposals} propostas)")
+        self.run_counters = {'iterations': rounds, 'proposals': total_proposals}
+        for p, code in enumerate(project_codes):
+            self.projects[code].proposal_index = int(state['next_choice'][p])
+        return self._finish_rounds(state, idx, collect_history, matching_data, rounds)
+
+    def _record_round(self, matching_data, round_number, students, projects, assignment, student_codes, project_codes):
+        # Snapshot no mesmo formato do modo sequencial (usado pelo GraphVisualizer)
+        proposals = list(zip(students.tolist(), projects.tolist()))
+        for s, p in proposals:
+            self.proposals_history.append({
+                'student': student_codes[s],
+                'project': project_codes[p],
+                'type': 'active'
+            })
+        matched = np.flatnonzero(assignment >= 0)
+        temp = {student_codes[s]: project_codes[p] for s, p in zip(matched.tolist(), assignment[matched].tolist())}
+        matching_data.append({
+            "iteration": round_number,
+            "proposals": [(f"S{student_codes[s]}", f"P{project_codes[p]}") for s, p in proposals],
+            "temporary_matches": [(f"S{s}", f"P{p}") for s, p in temp.items()],
+            "rejections": [(f"S{s}", f"P{p}") for s, p in self.rejections],
+            "final_matching": {f"S{s}": f"P{p}" for s, p in temp.items()}
+        })
+
+    def _finish_rounds(self, state, idx, collect_history, matching_data, rounds):
+        # Converte o vetor de atribuições de volta para as estruturas por código
+        student_codes, project_codes = idx["student_codes"], idx["project_codes"]
+        assignment = state['assignment']
+        matched = np.flatnonzero(assignment >= 0)
+        # Ordena cada projeto pela sua própria preferência (saída determinística)
+        matched = matched[np.lexsort((state['held_prank'][matched], assignment[matched]))]
+        for s, p in zip(matched.tolist(), assignment[matched].tolist()):
+            self.temporary_matching[student_codes[s]] = project_codes[p]
+            self.matching[project_codes[p]].append(student_codes[s])
+
+        self._finalize_matching()
+
+        if collect_history:
+            matching_data.append({
+                "iteration": rounds,
+                "proposals": [(f"S{str(p['student'])}", f"P{str(p['project'])}") for p in self.proposals_history],
+                "temporary_matches": [(f"S{str(s)}", f"P{str(p)}") for s, p in self.temporary_matching.items()],
+                "rejections": [(f"S{str(s)}", f"P{str(p)}") for s, p in self.rejections],
+                "final_matching": {f"S{str(s)}": f"P{str(p)}" for s, p in self.temporary_matching.items()}
+            })
+            return self.matching, matching_data
+
+        return self.matching
+
     # =========================================================================
     # MÉTODOS AUXILIARES (Originais + Novos Helpers)
     # =========================================================================
@@ -380,16 +740,22 @@ class GaleShapley:
             return None
         return self.proposals_history[iteration]
 
-    def get_matching_stats(self):
+    def get_matching_stats(self, total_students=None, total_projects=None):
+        """
+        :param total_students, total_projects: totais da instância original, quando
+            o algoritmo roda sobre uma instância reduzida (padrão: os do algoritmo)
+        """
+        total_students = len(self.students) if total_students is None else total_students
+        total_projects = len(self.projects) if total_projects is None else total_projects
         total_students_matched = sum(len(students) for students in self.matching.values())
         total_projects_active = sum(1 for students in self.matching.values() if len(students) >= 1)
 
         stats = {
-            'total_students': len(self.students),
+            'total_students': total_students,
             'total_students_matched': total_students_matched,
-            'total_projects': len(self.projects),
+            'total_projects': total_projects,
             'total_projects_active': total_projects_active,
-            'matching_rate': total_students_matched / len(self.students) if len(self.students) > 0 else 0
+            'matching_rate': total_students_matched / total_students if total_students > 0 else 0
         }
 
         return stats
@@ -0,0 +1,95 @@
+from file_parser import Project, Student
+
+class InstanceReducer:
+    """
+    Etapa de pré-processamento entre o FileParser e o GaleShapley.
+    Mantém apenas as arestas mutuamente aceitáveis (o aluno lista o projeto,
+    o projeto existe, o aluno tem a nota mínima e o projeto ranqueia o aluno),
+    para que o algoritmo não gaste iterações com pares que nunca casam.
+    """
+
+    def reduce(self, projects, students):
+        """
+        Retorna (projetos, alunos, estatísticas) da instância reduzida.
+        Os objetos originais não são alterados: são criadas cópias com as
+        listas de preferência filtradas.
+        """
+        stats = {
+            'projects_before': len(projects),
+            'students_before': len(students),
+            'edges_before': sum(len(s.preferences) for s in students),
+            'undefined_entries': 0,
+            'duplicate_entries': 0,
+            'grade_ineligible_entries': 0,
+            'unranked_entries': 0,       # Projeto não ranqueia o aluno
+            'unlisted_entries': 0,       # Aluno não lista o projeto
+        }
+
+        project_dict = {p.code: p for p in projects}
+        ranked_by = {p.code: set(p.preference_list) for p in projects}
+
+        # Filtra a lista de cada aluno (mantém a ordem original)
+        student_prefs = {}
+        for student in students:
+            prefs = []
+            seen = set()
+            for project_code in student.preferences:
+                if project_code not in project_dict:
+                    stats['undefined_entries'] += 1
+                elif project_code in seen:
+                    stats['duplicate_entries'] += 1
+                elif student.grade < project_dict[project_code].min_grade:
+                    stats['grade_ineligible_entries'] += 1
+                elif student.code not in ranked_by[project_code]:
+                    stats['unranked_entries'] += 1
+                else:
+                    prefs.append(project_code)
+                seen.add(project_code)
+            student_prefs[student.code] = prefs
+
+        # Filtra a lista de cada projeto: só alunos que listam o projeto
+        listed_by = {p.code: set() for p in projects}
+        for student_code, prefs in student_prefs.items():
+            for project_code in prefs:
+                listed_by[project_code].add(student_code)
+
+        reduced_projects = []
+        for project in projects:
+            preference_list = [code for code in project.preference_list if code in listed_by[project.code]]
+            stats['unlisted_entries'] += len(project.preference_list) - len(preference_list)
+
+            # Projeto sem candidatos elegíveis é descartado
+            if not preference_list:
+                continue
+
+            reduced = Project(code=project.code, max_students=project.max_students, min_grade=project.min_grade)
+            reduced.min_students = project.min_students
+            reduced.preference_list = preference_list
+            reduced_projects.append(reduced)
+
+        # Alunos com lista vazia são descartados
+        reduced_students = [Student(code=s.code, preferences=student_prefs[s.code], grade=s.grade)
+                            for s in students if student_prefs[s.code]]
+
+        stats['projects_after'] = len(reduced_projects)
+        stats['students_after'] = len(reduced_students)
+        stats['edges_after'] = sum(len(s.preferences) for s in reduced_students)
+        stats['dropped_projects'] = sorted(set(project_dict) - {p.code for p in reduced_projects})
+        stats['dropped_students'] = [s.code for s in students if not student_prefs[s.code]]
+
+        return reduced_projects, reduced_students, stats
+
+    def print_stats(self, stats):
+        print("\n       REDUÇÃO DA INSTÂNCIA")
+        print(f"Projetos: {stats['projects_before']} -> {stats['projects_after']}")
+        print(f"Alunos:   {stats['students_before']} -> {stats['students_after']}")
+        print(f"Arestas:  {stats['edges_before']} -> {stats['edges_after']}")
+        print(f"Removidas: {stats['undefined_entries']} projetos inexistentes, "
+              f"{stats['duplicate_entries']} repetidas, "
+              f"{stats['grade_ineligible_entries']} por nota insuficiente, "
+              f"{stats['unranked_entries']} não ranqueadas pelo projeto")
+        print(f"Entradas de projetos sem interesse do aluno removidas: {stats['unlisted_entries']}")
+        if stats['dropped_projects']:
+            print(f"Projetos sem candidatos: {', '.join(stats['dropped_projects'])}")
+        if stats['dropped_students']:
+            print(f"Alunos sem opções: {', '.join(stats['dropped_students'])}")
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from file_parser import FileParser
+from matching_service import HOST, PORT
+
+async def run_client(port, instance, students, projects, requests, whatif_ratio, latencies, rng):
+    """Um cliente: envia requisições uma a uma e mede a latência de cada operação."""
+    reader, writer = await asyncio.open_connection(HOST, port)
+    for request_id in range(requests):
+        if rng.random() < whatif_ratio:
+            project_code = rng.choice(projects)
+            request = {'op': 'whatif', 'instance': instance, 'proposer': rng.choice(("student", "project")),
+                       'changes': {project_code: {'max_students': rng.randint(1, 4)}}}
+        else:
+            request = {'op': 'assignment', 'instance': instance, 'student': rng.choice(students),
+                       'proposer': rng.choice(("student", "project"))}
+        request['id'] = request_id
+
+        start = time.perf_counter()
+        writer.write((json.dumps(request) + "\n").encode())
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.setdefault(request['op'], []).append(time.perf_counter() - start)
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+    writer.close()
+    await writer.wait_closed()
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+async def main(args):
+    # Descobre alunos e projetos da instância pelo próprio serviço
+    reader, writer = await asyncio.open_connection(HOST, args.port)
+    if args.path:
+        writer.write((json.dumps({'id': 0, 'op': 'load', 'instance': args.instance, 'path': args.path}) + "\n").encode())
+        await writer.drain()
+        print(json.loads(await reader.readline()))
+    writer.close()
+
+    with open(args.path or args.instance, 'r') as file:
+        content = file.read()
+    parser = FileParser()
+    projects = [p.code for p in parser.parse_projects(content)]
+    students = [s.code for s in parser.parse_students(content)]
+
+    rng = random.Random(args.seed)
+    latencies = {}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(args.port, args.instance, students, projects, args.requests,
+                                      args.whatif_ratio, latencies, random.Random(rng.random()))
+                           for _ in range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{total} requisições em {elapsed:.2f}s ({total / elapsed:.0f} req/s) com {args.clients} clientes")
+    for op, values in sorted(latencies.items()):
+        print(f"{op:<12} n={len(values):<7} p50={percentile(values, 0.5) * 1e6:9.0f}µs "
+              f"p99={percentile(values, 0.99) * 1e6:9.0f}µs max={max(values) * 1e6:9.0f}µs")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga do serviço de emparelhamento")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--instance", default="entradaProj2.25TAG.txt")
+    parser.add_argument("--path", default=None, help="Arquivo para carregar no serviço antes do teste")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500, help="Requisições por cliente")
+    parser.add_argument("--whatif-ratio", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
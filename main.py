@@ -1,57 +1,102 @@
 import os
+import random
 from gale_shapley import GaleShapley
 from graph_visualizer import GraphVisualizer
 from file_parser import FileParser
+from instance_reducer import InstanceReducer
+from results_store import ResultsStore
 
 class GraphMatching:
-    def __init__(self):
-        self.projects = []
+    def __init__(self, store=None):
+        """
+        :param store: ResultsStore opcional; se informado, cada cenário executado é gravado nele.
+        """
+        self.store = store
+        self.instance = None
+        self.label = None
+        self.projects = []          # Instância como lida do arquivo (usada nos relatórios)
         self.students = []
+        self.project_dict = {}
+        self.student_dict = {}
         self.matching = None
         self.algorithm = None
+        self.reduction_stats = None
         
-    def load_data(self, filename):
+    def load_data(self, filename, reduce=True, label=None):
+        """
+        Lê a instância do arquivo e, se reduce=True, remove os pares que nunca
+        podem casar (ver InstanceReducer) antes de criar o algoritmo. A redução
+        vale só para o algoritmo: relatórios usam as listas e totais originais.
+        :param label: Rótulo livre da instância (ex.: semestre), gravado no ResultsStore.
+        """
+        self.instance = os.path.basename(filename)
+        self.label = label
+        self.reduction_stats = None
         parser = FileParser()
         base_dir = os.path.dirname(__file__)
         path = os.path.join(base_dir, filename)
 
         self.projects, self.students = parser.parse_file(path)
+        self.project_dict = {p.code: p for p in self.projects}
+        self.student_dict = {s.code: s for s in self.students}
         print(f"Carregados {len(self.projects)} projetos e {len(self.students)} alunos")
+
+        solver_projects, solver_students = self.projects, self.students
+        if reduce:
+            reducer = InstanceReducer()
+            solver_projects, solver_students, self.reduction_stats = reducer.reduce(self.projects, self.students)
+            reducer.print_stats(self.reduction_stats)
         
         # Inicializa o algoritmo uma vez com os dados carregados
-        self.algorithm = GaleShapley(self.students, self.projects)
+        self.algorithm = GaleShapley(solver_students, solver_projects)
         
-    def run_scenario(self, proposer_type, random_order):
+    def run_scenario(self, proposer_type, random_order, batched=False, seed=None):
         """
         Executa uma rodada específica do algoritmo e gera o relatório imediato.
+        Com batched=True usa o modo em rodadas paralelas (vetorizado).
+        :param seed: Semente do gerador aleatório (para reproduzir a ordem aleatória).
         """
         # Define rótulos para exibição
         tipo_str = "ALUNOS PROPÕEM (Student-Optimal)" if proposer_type == "student" else "PROJETOS PROPÕEM (Project-Optimal)"
-        ordem_str = "Ordem ALEATÓRIA" if random_order else "Ordem SEQUENCIAL"
+        if batched:
+            ordem_str = "RODADAS PARALELAS"
+        else:
+            ordem_str = "Ordem ALEATÓRIA" if random_order else "Ordem SEQUENCIAL"
         
         print("\n" + "="*80)
         print(f">>> CENÁRIO: {tipo_str} | {ordem_str}")
         print("="*80)
 
+        if seed is not None:
+            random.seed(seed)
+
         # Executa o matching com os parâmetros novos
-        self.matching = self.algorithm.match(proposer_type=proposer_type, random_order=random_order)
+        self.matching = self.algorithm.match(proposer_type=proposer_type, random_order=random_order, batched=batched)
 
-        self.last_run_params = (proposer_type, random_order)
+        self.last_run_params = (proposer_type, random_order, batched)
             
         # Pega estatísticas
-        stats = self.algorithm.get_matching_stats()
+        stats = self.algorithm.get_matching_stats(total_students=len(self.students), total_projects=len(self.projects))
         print(f"Emparelhamento concluído: {stats['total_students_matched']}/{stats['total_students']} alunos alocados")
         print(f"Projetos ativos: {stats['total_projects_active']}/{stats['total_projects']}")
         
         # Gera o relatório deste cenário
         self.generate_report()
 
+        if self.store is not None:
+            run_id = self.store.append_run(self.algorithm, proposer_type, random_order=random_order, batched=batched,
+                                           seed=seed, instance=self.instance, label=self.label,
+                                           students=self.students, projects=self.projects,
+                                           reduced=self.reduction_stats is not None)
+            print(f"Execução gravada no ResultsStore (run_id={run_id})")
+
     def visualize_process(self, iterations=10):
         if not hasattr(self, "last_run_params"):
             raise RuntimeError("Nenhum cenário anterior encontrado")
 
-        proposer_type, random_order = self.last_run_params
-        matching, history = self.algorithm.match(proposer_type=proposer_type, random_order=random_order, collect_history=True)
+        proposer_type, random_order, batched = self.last_run_params
+        matching, history = self.algorithm.match(proposer_type=proposer_type, random_order=random_order,
+                                                 collect_history=True, batched=batched)
 
         visualizer = GraphVisualizer(self.students, self.projects, self.algorithm)
         visualizer.animate_matching(history)
@@ -72,10 +117,10 @@ class GraphMatching:
             student_codes = self.matching[project_code]
             # Apenas projetos com alunos
             if student_codes:
-                project = self.algorithm.projects[project_code]
+                project = self.project_dict[project_code]
                 
                 for student_code in student_codes:
-                    student = self.algorithm.students[student_code]
+                    student = self.student_dict[student_code]
                     
                     # Rank do aluno na preferência do projeto
                     project_rank = "N/A"
@@ -97,8 +142,8 @@ class GraphMatching:
         
         for project_code, student_codes in self.matching.items():
             for student_code in student_codes:
-                student = self.algorithm.students[student_code]
-                project = self.algorithm.projects[project_code]
+                student = self.student_dict[student_code]
+                project = self.project_dict[project_code]
                 
                 # Satisfação do aluno (1 = primeira escolha, 2 = segunda, etc.)
                 if project_code in student.preferences:
@@ -120,7 +165,7 @@ class GraphMatching:
             print(f"Média de satisfação dos PROJETOS: {avg_project:.4f} (1.0 = Perfeito)")
 
 if __name__ == "__main__":
-    graph = GraphMatching()
+    graph = GraphMatching(store=ResultsStore(os.path.join(os.path.dirname(__file__), "resultados")))
     # Carrega os dados apenas uma vez
     graph.load_data("entradaProj2.25TAG.txt")
     
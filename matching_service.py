@@ -0,0 +1,462 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from file_parser import FileParser, Project, Student
+from gale_shapley import GaleShapley
+from instance_reducer import InstanceReducer
+
+HOST = "127.0.0.1"
+PORT = 8765
+PROPOSERS = ("student", "project")
+
+# =============================================================================
+# RESOLUÇÃO (executada nos processos do pool)
+# =============================================================================
+def build_instance(raw, changes=None):
+    """
+    Monta objetos Project/Student a partir dos dados brutos de uma instância
+    (tuplas serializáveis), aplicando as alterações de projeto do what-if:
+    changes = {codigo_projeto: {'max_students': n, 'min_grade': m}}
+    """
+    changes = changes or {}
+    projects = []
+    for code, max_students, min_grade in raw['projects']:
+        change = changes.get(code, {})
+        projects.append(Project(code=code,
+                                max_students=int(change.get('max_students', max_students)),
+                                min_grade=int(change.get('min_grade', min_grade))))
+    students = [Student(code=code, preferences=list(prefs), grade=grade) for code, prefs, grade in raw['students']]
+
+    # As preferências dos projetos dependem de min_grade, então são geradas de novo
+    FileParser().generate_project_preferences(projects, students)
+    if raw['reduce']:
+        projects, students, _ = InstanceReducer().reduce(projects, students)
+    return projects, students
+
+def solve_instance(raw, proposer_type, changes=None):
+    """Resolve uma instância (modo em rodadas) e retorna {'assignment': {aluno: projeto}, 'stats': {...}}."""
+    projects, students = build_instance(raw, changes)
+    algorithm = GaleShapley(students, projects)
+    # Cada rodada tem ao menos uma proposta, e cada par (aluno, projeto) é proposto no máximo uma vez
+    max_rounds = sum(len(s.preferences) for s in students) + sum(len(p.preference_list) for p in projects) + 1
+    with contextlib.redirect_stdout(io.StringIO()):
+        matching = algorithm.match(proposer_type=proposer_type, batched=True, max_iterations=max_rounds)
+    if algorithm.run_counters['iterations'] >= max_rounds:
+        raise ServiceError(f"O algoritmo não convergiu em {max_rounds} rodadas")
+    return {
+        'assignment': {s: p for p, codes in matching.items() for s in codes},
+        'stats': algorithm.get_matching_stats(total_students=len(raw['students']), total_projects=len(raw['projects'])),
+    }
+
+def solve_batch(jobs):
+    """
+    Resolve um lote de what-ifs [(raw, proposer_type, changes)] num único processo.
+    Retorna um item por job, {'result': ...} ou {'error': ...}: a falha de um job
+    não afeta os outros do mesmo lote.
+    """
+    results = []
+    for raw, proposer_type, changes in jobs:
+        try:
+            results.append({'result': solve_instance(raw, proposer_type, changes)})
+        except Exception as error:
+            results.append({'error': f"{type(error).__name__}: {error}"})
+    return results
+
+# =============================================================================
+# ESTADO EM MEMÓRIA
+# =============================================================================
+class LoadedInstance:
+    """Instância já resolvida, com índices para consultas de leitura."""
+
+    def __init__(self, name, raw, solutions, generation=0):
+        self.name = name
+        self.raw = raw
+        self.generation = generation  # muda a cada 'load': separa o cache de what-ifs entre versões
+        self.assignment = {}    # {proposer: {aluno: projeto}}
+        self.members = {}       # {proposer: {projeto: [alunos]}}
+        self.stats = {}         # {proposer: get_matching_stats()}
+        for proposer_type, solution in solutions.items():
+            assignment = solution['assignment']
+            members = {code: [] for code, _, _ in raw['projects']}
+            for student_code, project_code in assignment.items():
+                members[project_code].append(student_code)
+            self.assignment[proposer_type] = assignment
+            self.members[proposer_type] = members
+            self.stats[proposer_type] = solution['stats']
+        self.student_codes = {code for code, _, _ in raw['students']}
+
+def parse_raw_instance(path, reduce=True):
+    # O FileParser troca um arquivo ausente por dados de exemplo; aqui isso é um erro
+    if not os.path.isfile(path):
+        raise ServiceError(f"Arquivo não encontrado: {path}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        projects, students = FileParser().parse_file(path)
+    return {
+        'projects': [(p.code, p.max_students, p.min_grade) for p in projects],
+        'students': [(s.code, list(s.preferences), s.grade) for s in students],
+        'reduce': reduce,
+    }
+
+class ServiceError(Exception):
+    pass
+
+# =============================================================================
+# SERVIÇO
+# =============================================================================
+class MatchingService:
+    """
+    Serviço local (asyncio, somente 127.0.0.1) que mantém instâncias e
+    emparelhamentos em memória. Protocolo: uma requisição JSON por linha,
+    {"id": ..., "op": ..., ...}; a resposta é uma linha JSON com o mesmo id e
+    "ok": true/false. Operações:
+    - load {instance, path, reduce?}
+    - instances {}
+    - assignment {instance, student, proposer?}
+    - project {instance, project, proposer?}
+    - stats {instance, proposer?}
+    - whatif {instance, changes, proposer?, student?}
+    Leituras são respondidas direto dos índices em memória; what-ifs
+    concorrentes são agrupados em lotes e resolvidos no pool de processos.
+    """
+
+    def __init__(self, port=PORT, workers=None, batch_window=0.005, max_batch=64, cache_size=1024):
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+
+        self.instances = {}
+        self.generation = 0
+        self.whatif_cache = OrderedDict()
+        self.writers = set()
+        self.pool = None
+        self.server = None
+        self.pending = None
+
+        self.handlers = {
+            'load': self.handle_load,
+            'instances': self.handle_instances,
+            'assignment': self.handle_assignment,
+            'project': self.handle_project,
+            'stats': self.handle_stats,
+            'whatif': self.handle_whatif,
+        }
+
+    async def start(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.pending = asyncio.Queue()
+        self.batcher = asyncio.create_task(self._batch_loop())
+        self.server = await asyncio.start_server(self._handle_connection, HOST, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        # wait_closed espera as conexões abertas terminarem: fecha os clientes antes
+        for writer in list(self.writers):
+            writer.close()
+        await self.server.wait_closed()
+        self.batcher.cancel()
+        while not self.pending.empty():
+            _, future = self.pending.get_nowait()
+            if not future.done():
+                future.set_exception(ServiceError("Serviço encerrado"))
+        # wait=False: não bloqueia o event loop esperando soluções em andamento
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    # -------------------------------------------------------------------------
+    # Conexões
+    # -------------------------------------------------------------------------
+    async def _handle_connection(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+        self.writers.add(writer)
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                # Cada requisição vira uma task: what-ifs lentos não bloqueiam leituras na mesma conexão
+                task = asyncio.create_task(self._respond(line, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, line, writer, write_lock):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            handler = self.handlers.get(request.get('op'))
+            if handler is None:
+                raise ServiceError(f"Operação desconhecida: {request.get('op')}")
+            result = handler(request)
+            if asyncio.iscoroutine(result):
+                result = await result
+            response = {'id': request_id, 'ok': True, 'result': result}
+        except Exception as error:
+            response = {'id': request_id, 'ok': False, 'error': str(error)}
+
+        async with write_lock:
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+    # -------------------------------------------------------------------------
+    # Operações
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _field(request, name):
+        if name not in request:
+            raise ServiceError(f"Campo obrigatório ausente: {name}")
+        return request[name]
+
+    def _instance(self, request):
+        name = self._field(request, 'instance')
+        if name not in self.instances:
+            raise ServiceError(f"Instância não carregada: {name}")
+        return self.instances[name]
+
+    def _proposer(self, request):
+        proposer_type = request.get('proposer', 'student')
+        if proposer_type not in PROPOSERS:
+            raise ServiceError("Tipo de proponente desconhecido. Use 'student' ou 'project'.")
+        return proposer_type
+
+    async def handle_load(self, request):
+        name, path = self._field(request, 'instance'), self._field(request, 'path')
+        raw = await asyncio.get_running_loop().run_in_executor(None, parse_raw_instance, path, request.get('reduce', True))
+        solutions = dict(zip(PROPOSERS, await self._solve([(raw, p, None) for p in PROPOSERS])))
+        self.generation += 1
+        self.instances[name] = LoadedInstance(name, raw, solutions, self.generation)
+        # Resultados de what-if antigos desta instância deixam de valer; os que ainda
+        # estão em andamento gravam com a geração antiga e nunca são lidos de novo
+        for key in [k for k in self.whatif_cache if k[0] == name]:
+            del self.whatif_cache[key]
+        return {'instance': name, 'projects': len(raw['projects']), 'students': len(raw['students'])}
+
+    def handle_instances(self, request):
+        return sorted(self.instances)
+
+    def _student(self, instance, request):
+        student_code = self._field(request, 'student')
+        if student_code not in instance.student_codes:
+            raise ServiceError(f"Aluno desconhecido: {student_code}")
+        return student_code
+
+    def handle_assignment(self, request):
+        instance = self._instance(request)
+        student_code = self._student(instance, request)
+        return instance.assignment[self._proposer(request)].get(student_code)
+
+    def handle_project(self, request):
+        instance = self._instance(request)
+        members = instance.members[self._proposer(request)]
+        project_code = self._field(request, 'project')
+        if project_code not in members:
+            raise ServiceError(f"Projeto desconhecido: {project_code}")
+        return members[project_code]
+
+    def handle_stats(self, request):
+        return self._instance(request).stats[self._proposer(request)]
+
+    @staticmethod
+    def _validate_changes(instance, changes):
+        """
+        Confere as alterações antes de enfileirar e converte os valores para
+        inteiros não negativos, para que um what-if inválido falhe sozinho.
+        """
+        if not isinstance(changes, dict):
+            raise ServiceError("'changes' deve ser um objeto {projeto: {campo: valor}}")
+        known = {code for code, _, _ in instance.raw['projects']}
+        normalized = {}
+        for code, change in changes.items():
+            if code not in known:
+                raise ServiceError(f"Projeto desconhecido: {code}")
+            if not isinstance(change, dict) or set(change) - {'max_students', 'min_grade'}:
+                raise ServiceError("Alterações suportadas: max_students, min_grade")
+            normalized[code] = {}
+            for field, value in change.items():
+                if isinstance(value, bool):
+                    value = None
+                elif isinstance(value, str) and value.strip().isdigit():
+                    value = int(value)
+                elif isinstance(value, float) and value.is_integer():
+                    value = int(value)
+                if not isinstance(value, int) or value < 0:
+                    raise ServiceError(f"Valor inválido para {code}.{field}: {change[field]!r} (use um inteiro >= 0)")
+                normalized[code][field] = value
+        return normalized
+
+    async def handle_whatif(self, request):
+        instance = self._instance(request)
+        proposer_type = self._proposer(request)
+        changes = self._validate_changes(instance, request.get('changes') or {})
+        student_code = self._student(instance, request) if 'student' in request else None
+
+        key = (instance.name, instance.generation, proposer_type, json.dumps(changes, sort_keys=True))
+        solution = self.whatif_cache.get(key)
+        if solution is None:
+            solution = (await self._solve([(instance.raw, proposer_type, changes)]))[0]
+            # Só guarda se a instância não foi recarregada enquanto resolvia
+            if self.instances.get(instance.name) is instance:
+                self.whatif_cache[key] = solution
+                if len(self.whatif_cache) > self.cache_size:
+                    self.whatif_cache.popitem(last=False)
+        else:
+            self.whatif_cache.move_to_end(key)
+
+        # Resume o que mudou em relação ao emparelhamento base
+        baseline = instance.assignment[proposer_type]
+        assignment = solution['assignment']
+        moved = {s: [baseline.get(s), assignment.get(s)]
+                 for s in sorted(set(baseline) | set(assignment)) if baseline.get(s) != assignment.get(s)}
+        result = {'stats': solution['stats'], 'moved': moved}
+        if student_code is not None:
+            result['assignment'] = assignment.get(student_code)
+        return result
+
+    # -------------------------------------------------------------------------
+    # Lotes para o pool de processos
+    # -------------------------------------------------------------------------
+    async def _solve(self, jobs):
+        futures = []
+        for job in jobs:
+            future = asyncio.get_running_loop().create_future()
+            await self.pending.put((job, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.pending.get()]
+            # Espera um pouco para juntar pedidos concorrentes no mesmo lote
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.pending.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Divide o lote entre os workers
+            chunk_size = -(-len(batch) // self.workers)
+            for start in range(0, len(batch), chunk_size):
+                chunk = batch[start:start + chunk_size]
+                try:
+                    task = loop.run_in_executor(self.pool, solve_batch, [job for job, _ in chunk])
+                except (BrokenProcessPool, RuntimeError) as error:
+                    # Pool quebrado (worker morreu): falha este pedaço e recria o pool para os próximos
+                    self._fail(chunk, error)
+                    self._rebuild_pool()
+                    continue
+                task.add_done_callback(lambda done, chunk=chunk, pool=self.pool: self._deliver(done, chunk, pool))
+
+    def _rebuild_pool(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    @staticmethod
+    def _fail(chunk, error):
+        for _, future in chunk:
+            if not future.done():
+                future.set_exception(ServiceError(f"Falha ao resolver: {type(error).__name__}: {error}"))
+
+    def _deliver(self, done, chunk, pool):
+        # Erro no lote inteiro (ex.: worker morreu) falha todos; senão cada job tem o seu resultado
+        error = done.exception()
+        if isinstance(error, BrokenProcessPool) and pool is self.pool:
+            self._rebuild_pool()
+        outcomes = [{'error': str(error)}] * len(chunk) if error is not None else done.result()
+        for (_, future), outcome in zip(chunk, outcomes):
+            if future.done():
+                continue
+            if 'error' in outcome:
+                future.set_exception(ServiceError(f"Falha ao resolver: {outcome['error']}"))
+            else:
+                future.set_result(outcome['result'])
+
+# =============================================================================
+# CLIENTE
+# =============================================================================
+class MatchingClient:
+    """Cliente síncrono simples para o MatchingService (uma conexão TCP local)."""
+
+    def __init__(self, port=PORT, timeout=60):
+        self.socket = socket.create_connection((HOST, port), timeout=timeout)
+        self.file = self.socket.makefile('rwb')
+        self.next_id = 0
+
+    def request(self, op, **params):
+        self.next_id += 1
+        self.file.write((json.dumps({'id': self.next_id, 'op': op, **params}) + "\n").encode())
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if not response['ok']:
+            raise ServiceError(response['error'])
+        return response['result']
+
+    def load(self, instance, path, reduce=True):
+        return self.request('load', instance=instance, path=os.path.abspath(path), reduce=reduce)
+
+    def assignment(self, instance, student, proposer="student"):
+        return self.request('assignment', instance=instance, student=student, proposer=proposer)
+
+    def project(self, instance, project, proposer="student"):
+        return self.request('project', instance=instance, project=project, proposer=proposer)
+
+    def stats(self, instance, proposer="student"):
+        return self.request('stats', instance=instance, proposer=proposer)
+
+    def whatif(self, instance, changes, proposer="student", student=None):
+        params = {'instance': instance, 'changes': changes, 'proposer': proposer}
+        if student is not None:
+            params['student'] = student
+        return self.request('whatif', **params)
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+async def main(args):
+    service = await MatchingService(port=args.port, workers=args.workers).start()
+    for spec in args.load:
+        name, _, path = spec.partition("=")
+        result = await service.handle_load({'instance': name, 'path': path or name})
+        print(f"Instância '{name}' carregada: {result['projects']} projetos e {result['students']} alunos")
+    print(f"Serviço de emparelhamento em {HOST}:{service.port} ({service.workers} workers)")
+    await service.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviço local de emparelhamento estável")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--load", action="append", default=[], metavar="NOME=ARQUIVO",
+                        help="Instância para carregar ao iniciar (pode repetir)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,281 @@
+import contextlib
+import fcntl
+import json
+import os
+import time
+
+import numpy as np
+
+class ResultsStore:
+    """
+    Armazenamento local, somente de inclusão (append-only) e colunar, dos
+    resultados de cada execução do algoritmo.
+
+    Estrutura do diretório:
+    - runs.jsonl: uma linha JSON por execução (metadados, contadores e o
+      intervalo de linhas [row_start, row_start + row_count) nas colunas)
+    - codes.txt: dicionário de códigos (linha i = código de id i)
+    - <coluna>.i4: uma coluna int32 por arquivo, lida via np.memmap
+
+    As colunas são gravadas antes da linha em runs.jsonl, que funciona como
+    marca de confirmação: linhas sem metadados (execução interrompida) são
+    ignoradas pelas consultas.
+
+    Vários escritores (processos ou instâncias) podem gravar no mesmo diretório:
+    append_run segura uma trava exclusiva (fcntl.flock em .lock) do começo ao fim.
+    """
+
+    COLUMNS = ('run_id', 'student', 'project', 'student_rank', 'project_rank', 'grade')
+    DTYPE = np.int32
+    CHUNK_ROWS = 1 << 20
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.runs_path = os.path.join(directory, "runs.jsonl")
+        self.codes_path = os.path.join(directory, "codes.txt")
+        self.lock_path = os.path.join(directory, ".lock")
+
+        self.codes = []
+        self.code_ids = {}
+        self._reload_codes()
+
+    # =========================================================================
+    # ESCRITA
+    # =========================================================================
+    def append_run(self, algorithm, proposer_type, random_order=False, batched=False, seed=None, instance=None,
+                   label=None, students=None, projects=None, reduced=False):
+        """
+        Grava o emparelhamento atual de 'algorithm' (um GaleShapley já executado).
+        Todos os alunos da instância são gravados; não alocados ficam com projeto -1.
+        Retorna o run_id da nova execução.
+        :param students, projects: instância original, quando 'algorithm' roda sobre
+            uma instância reduzida. Ranks e totais são sempre calculados sobre ela,
+            para que execuções com e sem redução sejam comparáveis.
+        :param reduced: se o algoritmo rodou sobre a instância reduzida (gravado nos metadados)
+        """
+        students = list(algorithm.students.values()) if students is None else students
+        projects = list(algorithm.projects.values()) if projects is None else projects
+        project_dict = {p.code: p for p in projects}
+
+        # Trava exclusiva durante toda a gravação: outro escritor (processo ou instância
+        # do store) não pode ler o mesmo run_id/row_start nem reusar ids de código
+        with self._write_lock():
+            # Outro escritor pode ter gravado códigos novos desde a última leitura
+            self._reload_codes()
+            self._discard_partial_line(self.codes_path)
+            self._discard_partial_line(self.runs_path)
+            runs = self.runs()
+            run_id = len(runs)
+            row_start = runs[-1]['row_start'] + runs[-1]['row_count'] if runs else 0
+
+            new_codes = []
+            def code_id(code):
+                if code not in self.code_ids:
+                    self._register_code(code)
+                    new_codes.append(code)
+                return self.code_ids[code]
+
+            columns = {name: [] for name in self.COLUMNS}
+            assigned = {s: p for p, students in algorithm.matching.items() for s in students}
+            for student in students:
+                student_code = student.code
+                project_code = assigned.get(student_code)
+                student_rank = project_rank = 0
+                if project_code is not None:
+                    project = project_dict[project_code]
+                    if project_code in student.preferences:
+                        student_rank = student.preferences.index(project_code) + 1
+                    if student_code in project.preference_list:
+                        project_rank = project.preference_list.index(student_code) + 1
+
+                columns['run_id'].append(run_id)
+                columns['student'].append(code_id(student_code))
+                columns['project'].append(code_id(project_code) if project_code is not None else -1)
+                columns['student_rank'].append(student_rank)
+                columns['project_rank'].append(project_rank)
+                columns['grade'].append(student.grade)
+
+            if new_codes:
+                with open(self.codes_path, 'a') as file:
+                    file.writelines(code + "\n" for code in new_codes)
+
+            # Descarta linhas órfãs de uma gravação interrompida antes de anexar
+            for name in self.COLUMNS:
+                path = self._column_path(name)
+                with open(path, 'ab') as file:
+                    file.truncate(row_start * np.dtype(self.DTYPE).itemsize)
+                    file.write(np.asarray(columns[name], dtype=self.DTYPE).tobytes())
+
+            stats = algorithm.get_matching_stats(total_students=len(students), total_projects=len(projects))
+            metadata = {
+                'run_id': run_id,
+                'timestamp': time.time(),
+                'instance': instance,
+                'label': label,
+                'proposer_type': proposer_type,
+                'random_order': random_order,
+                'batched': batched,
+                'seed': seed,
+                'reduced': reduced,
+                'counters': dict(algorithm.run_counters),
+                'stats': stats,
+                'row_start': row_start,
+                'row_count': len(students),
+            }
+            with open(self.runs_path, 'a') as file:
+                file.write(json.dumps(metadata) + "\n")
+
+        return run_id
+
+    # =========================================================================
+    # CONSULTAS
+    # =========================================================================
+    def runs(self, **filters):
+        """Lista os metadados das execuções, filtrando por igualdade (ex.: proposer_type='student')."""
+        result = []
+        for line in self._complete_lines(self.runs_path):
+            if not line.strip():
+                continue
+            run = json.loads(line)
+            if all(run.get(key) == value for key, value in filters.items()):
+                result.append(run)
+        return result
+
+    def get_run(self, run_id):
+        for run in self.runs(run_id=run_id):
+            return run
+        raise KeyError(f"Execução {run_id} não encontrada")
+
+    def load_assignments(self, run_id):
+        """Retorna {aluno: (projeto ou None, rank do aluno, rank do projeto, nota)} de uma execução."""
+        run = self.get_run(run_id)
+        start, stop = run['row_start'], run['row_start'] + run['row_count']
+        columns = {name: self._column(name)[start:stop] for name in self.COLUMNS[1:]}
+
+        assignments = {}
+        for student, project, student_rank, project_rank, grade in zip(
+                *(columns[name].tolist() for name in self.COLUMNS[1:])):
+            assignments[self._code(student)] = (
+                self._code(project) if project >= 0 else None, student_rank, project_rank, grade)
+        return assignments
+
+    def diff_runs(self, run_a, run_b):
+        """
+        Lista os alunos cujo projeto difere entre duas execuções:
+        [(aluno, projeto em run_a, projeto em run_b)], ordenado por aluno.
+        """
+        assignments_a = self.load_assignments(run_a)
+        assignments_b = self.load_assignments(run_b)
+
+        changes = []
+        for student in sorted(set(assignments_a) | set(assignments_b)):
+            project_a = assignments_a.get(student, (None,))[0]
+            project_b = assignments_b.get(student, (None,))[0]
+            if project_a != project_b:
+                changes.append((student, project_a, project_b))
+        return changes
+
+    def proposer_changes(self, instance=None, label=None):
+        """
+        Compara a execução Student-Optimal e a Project-Optimal mais recentes de
+        uma mesma instância e retorna os alunos que mudam de projeto.
+        instance/label = None não filtram: vale a instância da Project-Optimal mais recente.
+        """
+        filters = {key: value for key, value in (('instance', instance), ('label', label)) if value is not None}
+        project_runs = self.runs(proposer_type="project", **filters)
+        student_runs = []
+        if project_runs:
+            latest = project_runs[-1]
+            student_runs = self.runs(proposer_type="student", instance=latest['instance'], label=latest['label'])
+        if not student_runs or not project_runs:
+            raise KeyError("É preciso ao menos uma execução de cada tipo de proponente para essa instância")
+        return self.diff_runs(student_runs[-1]['run_id'], project_runs[-1]['run_id'])
+
+    def rank_distribution(self, run_ids=None, side="student", **filters):
+        """
+        Conta quantos alunos ficaram com cada rank ({rank: quantidade}) nas
+        execuções indicadas (todas, se run_ids=None). Lê as colunas em blocos
+        via memmap, sem carregar todas as execuções na memória.
+        :param side: 'student' (rank do projeto na lista do aluno) ou 'project'
+        :param filters: filtros de metadados, como em runs() (ex.: reduced=True)
+        """
+        if side not in ("student", "project"):
+            raise ValueError("Lado desconhecido. Use 'student' ou 'project'.")
+
+        runs = self.runs()
+        if not runs:
+            return {}
+        if filters:
+            matching = [run['run_id'] for run in self.runs(**filters)]
+            run_ids = matching if run_ids is None else sorted(set(run_ids) & set(matching))
+        total_rows = runs[-1]['row_start'] + runs[-1]['row_count']
+        ranks = self._column(f"{side}_rank")[:total_rows]
+        run_column = self._column('run_id')[:total_rows]
+        projects = self._column('project')[:total_rows]
+        selected = None if run_ids is None else np.asarray(sorted(run_ids), dtype=self.DTYPE)
+
+        counts = np.zeros(1, dtype=np.int64)
+        for start in range(0, total_rows, self.CHUNK_ROWS):
+            stop = min(start + self.CHUNK_ROWS, total_rows)
+            mask = projects[start:stop] >= 0
+            if selected is not None:
+                mask &= np.isin(run_column[start:stop], selected)
+            chunk_counts = np.bincount(ranks[start:stop][mask])
+            if chunk_counts.size > counts.size:
+                counts.resize(chunk_counts.size)
+            counts[:chunk_counts.size] += chunk_counts
+
+        # Rank 0 = aluno alocado a projeto fora da sua lista (N/A)
+        return {rank: int(count) for rank, count in enumerate(counts) if count}
+
+    # =========================================================================
+    # AUXILIARES
+    # =========================================================================
+    def _complete_lines(self, path):
+        """Linhas completas do arquivo: uma última linha sem '\\n' é gravação interrompida e é ignorada."""
+        if not os.path.exists(path):
+            return []
+        with open(path, 'r') as file:
+            content = file.read()
+        return content.split("\n")[:-1]
+
+    def _discard_partial_line(self, path):
+        # Remove uma última linha incompleta antes de anexar a próxima
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb+') as file:
+            content = file.read()
+            if content and not content.endswith(b"\n"):
+                file.truncate(content.rfind(b"\n") + 1)
+
+    @contextlib.contextmanager
+    def _write_lock(self):
+        with open(self.lock_path, 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def _reload_codes(self):
+        for line in self._complete_lines(self.codes_path)[len(self.codes):]:
+            self._register_code(line)
+
+    def _code(self, code_id):
+        if code_id >= len(self.codes):
+            self._reload_codes()
+        return self.codes[code_id]
+
+    def _register_code(self, code):
+        self.code_ids[code] = len(self.codes)
+        self.codes.append(code)
+
+    def _column_path(self, name):
+        return os.path.join(self.directory, f"{name}.i4")
+
+    def _column(self, name):
+        path = self._column_path(name)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=self.DTYPE)
+        return np.memmap(path, dtype=self.DTYPE, mode='r')
@@ -0,0 +1,61 @@
+import argparse
+import contextlib
+import io
+import random
+import sys
+
+from file_parser import FileParser, Project, Student
+from gale_shapley import GaleShapley
+from instance_reducer import InstanceReducer
+
+def random_instance(rng, max_projects, max_students):
+    """
+    Instância aleatória como sai do FileParser: listas com projetos inexistentes
+    e repetidos, notas abaixo do mínimo etc. A redução remove esses casos, e as
+    preferências passam a ser estritas dos dois lados.
+    """
+    n_projects = rng.randint(1, max_projects)
+    projects = [Project(code=f"P{i}", max_students=rng.randint(1, 3), min_grade=rng.randint(1, 5))
+                for i in range(n_projects)]
+    students = [Student(code=f"A{i}",
+                        preferences=[f"P{rng.randint(0, n_projects + 1)}" for _ in range(rng.randint(0, 5))],
+                        grade=rng.randint(1, 5))
+                for i in range(rng.randint(1, max_students))]
+    FileParser().generate_project_preferences(projects, students)
+    projects, students, _ = InstanceReducer().reduce(projects, students)
+    return projects, students
+
+def solve(algorithm, proposer_type, batched):
+    # max_iterations alto: o modo sequencial conta uma iteração por proposta
+    with contextlib.redirect_stdout(io.StringIO()):
+        matching = algorithm.match(proposer_type=proposer_type, batched=batched, max_iterations=10 ** 7)
+    return {project: sorted(students) for project, students in matching.items()}
+
+def check(instances, seed, max_projects, max_students):
+    """
+    Compara o modo em rodadas (batched=True) com o sequencial nos dois lados
+    proponentes. Retorna a lista de divergências [(instância, proponente)].
+    """
+    mismatches = []
+    for index in range(instances):
+        rng = random.Random(seed + index)
+        projects, students = random_instance(rng, max_projects, max_students)
+        algorithm = GaleShapley(students, projects)
+        for proposer_type in ("student", "project"):
+            if solve(algorithm, proposer_type, False) != solve(algorithm, proposer_type, True):
+                mismatches.append((seed + index, proposer_type))
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confere o modo em rodadas contra o modo sequencial")
+    parser.add_argument("--instances", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-projects", type=int, default=10)
+    parser.add_argument("--max-students", type=int, default=30)
+    args = parser.parse_args()
+
+    mismatches = check(args.instances, args.seed, args.max_projects, args.max_students)
+    for instance_seed, proposer_type in mismatches[:10]:
+        print(f"Divergência: semente {instance_seed}, proponente '{proposer_type}'")
+    print(f"{args.instances} instâncias, {len(mismatches)} divergências")
+    sys.exit(1 if mismatches else 0)